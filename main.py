@@ -1,22 +1,46 @@
+import asyncio
+import multiprocessing
 import os
 import re
+import string
 import unicodedata
 import zipfile
 import io
+import shutil
+import tempfile
+import time
 import uuid
-from collections import Counter
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager, closing
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import List
 
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from docx import Document
+from docx.opc.constants import CONTENT_TYPE as CT, RELATIONSHIP_TYPE as RT
+from docx.oxml.simpletypes import ST_HpsMeasure, ST_OnOff
+from lxml import etree
 
 # ==========================
 # Inicialización de FastAPI
 # ==========================
-app = FastAPI(title="Validador de Transcripciones")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    os.makedirs(DOWNLOADS_DIR, exist_ok=True)
+    purge_stale_downloads()
+    yield
+    EXECUTOR.shutdown(wait=False, cancel_futures=True)
+    for task in list(_EXPIRY_TASKS):
+        task.cancel()
+    for token in list(DOWNLOADS):
+        remove_download(token)
+
+app = FastAPI(title="Validador de Transcripciones", lifespan=lifespan)
 
 # ==========================
 # CORS: habilitar solo dominios permitidos
@@ -41,21 +65,81 @@ app.add_middleware(
 # ==========================
 # Descargas temporales
 # ==========================
-DOWNLOADS = {}
+DOWNLOADS = {}  # token -> (ruta del zip en disco, expiración)
 EXP_MINUTES = 5  # tiempo de expiración del link en minutos
+DOWNLOADS_DIR = os.path.join(tempfile.gettempdir(), "validador_descargas")
+_EXPIRY_TASKS = set()  # referencias a las tareas de expiración pendientes
+
+def remove_download(token: str):
+    """Quitar un token y borrar su zip del disco"""
+    item = DOWNLOADS.pop(token, None)
+    if item:
+        try:
+            os.unlink(item[0])
+        except FileNotFoundError:
+            pass
 
 def cleanup_downloads():
     """Eliminar tokens expirados"""
     now = datetime.utcnow()
     expired = [t for t, (_, exp) in DOWNLOADS.items() if exp <= now]
     for t in expired:
-        DOWNLOADS.pop(t, None)
+        remove_download(t)
+
+def purge_stale_downloads():
+    """Borrar zips vencidos que quedaron en disco (p. ej. tras un reinicio o caída).
+
+    Solo se tocan los más viejos que EXP_MINUTES, así que es seguro con varios
+    workers de uvicorn compartiendo DOWNLOADS_DIR.
+    """
+    limite = time.time() - EXP_MINUTES * 60
+    for entry in os.scandir(DOWNLOADS_DIR):
+        try:
+            if entry.name.endswith(".zip") and entry.stat().st_mtime <= limite:
+                os.unlink(entry.path)
+        except FileNotFoundError:
+            pass
+
+async def _expire_download(token: str, delay: float):
+    await asyncio.sleep(delay)
+    remove_download(token)
+
+def schedule_expiry(token: str):
+    """Programar el borrado del token al vencer EXP_MINUTES"""
+    task = asyncio.create_task(_expire_download(token, EXP_MINUTES * 60))
+    _EXPIRY_TASKS.add(task)
+    task.add_done_callback(_EXPIRY_TASKS.discard)
 
 # ==========================
 # Validaciones
 # ==========================
 ETIQUETAS_VALIDAS = ["ENTREVISTADOR:", "ENTREVISTADORA:", "ENTREVISTADO:", "ENTREVISTADA:"]
-REGEX_PERMITIDOS = r"[^A-Za-zÁÉÍÓÚáéíóúÑñ0-9\s\.,:\?¿]"
+VALID_PREFIXES = tuple(ETIQUETAS_VALIDAS)  # para str.startswith
+_ENTREV_SET = frozenset({"ENTREVISTADOR:", "ENTREVISTADORA:"})  # exigen negrita
+
+# Equivale a la clase [A-Za-zÁÉÍÓÚáéíóúÑñ0-9\s\.,:\?¿]; \s incluye todo el
+# whitespace Unicode (el último es U+3000), igual que str.isspace()
+CARACTERES_PERMITIDOS = frozenset(
+    string.ascii_letters + string.digits + "ÁÉÍÓÚáéíóúÑñ.,:?¿"
+) | frozenset(c for c in map(chr, range(0x3001)) if c.isspace())
+
+# Bytes ASCII permitidos: con bytes.translate(None, ...) quedan solo los prohibidos
+_ASCII_PERMITIDOS = bytes(i for i in range(128) if chr(i) in CARACTERES_PERMITIDOS)
+
+# Patrones precompilados (compartidos entre requests)
+TIMESTAMP_RE = re.compile(r"\d{1,2}:\d{2}")
+ETIQUETA_RE = re.compile(r"^([A-ZÁÉÍÓÚÑ]+:)")
+# re.ASCII: solo plegado de mayúsculas ASCII, como "speaker" in texto.lower()
+# (sin él, 'ſpeaker' o 'USUARİO' también coincidirían). El único carácter no
+# ASCII cuyo lower() forma parte de una coincidencia es U+212A (KELVIN SIGN -> 'k').
+KEYWORD_RE = re.compile(r"speaker|usuario|xxx", re.IGNORECASE | re.ASCII)
+
+# Mensajes por palabra clave prohibida (en el orden en que se reportan)
+KEYWORD_MESSAGES = {
+    "speaker": "'{texto}' → usa ENTREVISTADOR/ENTREVISTADO",
+    "usuario": "Se encontró 'Usuario'. Usa ENTREVISTADO: o ENTREVISTADOR:",
+    "xxx": "'{texto}' → reemplázalo por la etiqueta correcta.",
+}
 
 def char_human(ch: str) -> str:
     code = f"U+{ord(ch):04X}"
@@ -63,85 +147,352 @@ def char_human(ch: str) -> str:
     visible = ch if not ch.isspace() else repr(ch)
     return f"{visible} ({code} {name})"
 
-def validar_y_limpiar(doc: Document, filename: str):
+def caracteres_raros(texto: str) -> set:
+    """Caracteres no permitidos presentes en texto (vía rápida para ASCII)"""
+    if texto.isascii():
+        raros = texto.encode("ascii").translate(None, _ASCII_PERMITIDOS)
+        return set(raros.decode("ascii")) if raros else set()
+    return set(texto).difference(CARACTERES_PERMITIDOS)
+
+# Solo se memoizan textos cortos: la clave y los mensajes guardan el párrafo entero
+_MAX_TEXTO_CACHE = 200
+
+def validar_texto(texto: str):
+    """Chequeos que dependen solo del texto: ((tipo, desc), ...) y la etiqueta que exige negrita.
+
+    Las transcripciones repiten muchas líneas cortas ("Sí.", "No.", etiquetas solas),
+    así que esas se memoizan; los chequeos de runs (negrita/fuente) quedan fuera.
+    """
+    if len(texto) <= _MAX_TEXTO_CACHE:
+        return _validar_texto_cache(texto)
+    return _validar_texto(texto)
+
+def _validar_texto(texto: str):
+    errores = []
+
+    # Palabras clave prohibidas (una sola búsqueda para todas)
+    texto_kw = texto.replace("\u212a", "k") if "\u212a" in texto else texto
+    encontradas = {m.lower() for m in KEYWORD_RE.findall(texto_kw)}
+    if encontradas:
+        for clave, mensaje in KEYWORD_MESSAGES.items():
+            if clave in encontradas:
+                errores.append(("Etiqueta inválida", mensaje.format(texto=texto)))
+
+    etiqueta_negrita = None  # etiqueta que exige el párrafo en negrita
+    # Vía rápida: etiquetas válidas con startswith; el regex solo captura las desconocidas
+    if texto.startswith(VALID_PREFIXES):
+        etiqueta = next(p for p in VALID_PREFIXES if texto.startswith(p))
+        if texto == etiqueta:
+            errores.append(("Formato incorrecto", f"La etiqueta '{etiqueta}' está sola."))
+
+        if etiqueta in _ENTREV_SET:
+            etiqueta_negrita = etiqueta
+    elif texto[0].isupper():
+        match = ETIQUETA_RE.match(texto)
+        if match:
+            errores.append(("Etiqueta inválida", f"Se encontró '{match.group(1)}'"))
+
+    return tuple(errores), etiqueta_negrita
+
+_validar_texto_cache = lru_cache(maxsize=16384)(_validar_texto)
+
+def fuente_run(run):
+    """(fuente, tamaño) propios del run; None si se heredan del estilo.
+
+    Lo heredado no se valida, así que en un run de python-docx sin <w:rPr>
+    se evita armar Font y recorrer rFonts/sz.
+    """
+    if isinstance(run, RunXML):
+        return run.font
+    rPr = run._r.rPr
+    if rPr is None:
+        return None, None
+    return rPr.rFonts_ascii, rPr.sz_val
+
+def validar_parrafos(paragraphs):
+    """Valida y limpia los párrafos; devuelve (errores, caracteres eliminados)"""
     errores = []
     especiales_count = 0
-    char_counter = Counter()
 
-    for i, para in enumerate(doc.paragraphs):
+    for i, para in enumerate(paragraphs):
         texto = para.text.strip()
         if not texto:
             continue
 
-        texto_norm = texto.lower()
-
         # Ignorar timestamps tipo mm:ss
-        if re.fullmatch(r"\d{1,2}:\d{2}", texto):
+        if TIMESTAMP_RE.fullmatch(texto):
             continue
 
-        # Validaciones etiquetas
-        if "speaker" in texto_norm:
-            errores.append((i+1, "Etiqueta inválida", f"'{texto}' → usa ENTREVISTADOR/ENTREVISTADO"))
+        # Validaciones de etiquetas (cacheadas por texto)
+        errores_texto, etiqueta_negrita = validar_texto(texto)
+        errores.extend((i+1, tipo, desc) for tipo, desc in errores_texto)
 
-        if "usuario" in texto_norm:
-            errores.append((i+1, "Etiqueta inválida", f"Se encontró 'Usuario'. Usa ENTREVISTADO: o ENTREVISTADOR:"))
+        # Una sola pasada por los runs: negrita, fuente/tamaño y limpieza
+        encabezado_ok = False
+        all_bold = True
+        error_fuente = None
+        for run in para.runs:
+            texto_run = run.text
+
+            # Negrita (solo si la etiqueta lo exige y aún no se decidieron ambos chequeos)
+            if etiqueta_negrita and (all_bold or not encabezado_ok):
+                stripped = texto_run.strip()
+                if stripped:
+                    bold = run.bold
+                    if bold and stripped.startswith(etiqueta_negrita):
+                        encabezado_ok = True
+                    if not bold:
+                        all_bold = False
+
+            # Fuente/tamaño (se reporta solo el primer run incorrecto)
+            if error_fuente is None:
+                fuente, size = fuente_run(run)
+                tamano = size.pt if size else None
+                if fuente and fuente.lower() != "arial":
+                    error_fuente = ("Fuente incorrecta", f"Fuente '{fuente}' en vez de Arial.")
+                elif tamano and tamano != 12:
+                    error_fuente = ("Tamaño incorrecto", f"{tamano}pt en vez de 12pt.")
+
+            # Limpieza de caracteres: count/replace por carácter raro (búsqueda en C, sin regex)
+            if texto_run:
+                raros = caracteres_raros(texto_run)
+                if raros:
+                    limpio = texto_run
+                    for ch in raros:
+                        especiales_count += limpio.count(ch)
+                        limpio = limpio.replace(ch, "")
+                    run.text = limpio
+
+        if etiqueta_negrita:
+            if not encabezado_ok:
+                errores.append((i+1, "Encabezado sin negrita", f"La etiqueta '{etiqueta_negrita}' debería estar en negrita."))
+            if not all_bold:
+                errores.append((i+1, "Formato en negrita", f"El texto de '{etiqueta_negrita}' debería estar completamente en negrita."))
+
+        if error_fuente:
+            errores.append((i+1, *error_fuente))
+
+    return errores, especiales_count
+
+def crear_reporte(filename: str, errores, especiales_count: int) -> bytes:
+    """Reporte TXT (se arma en una lista y se codifica una sola vez)"""
+    partes = [f"📋 REPORTE: {filename}\nGenerado: {datetime.now()}\n\n"]
+    for linea, tipo, desc in errores:
+        partes.append(f"Línea {linea}: {tipo} → {desc}\n")
 
-        if "xxx" in texto_norm:
-            errores.append((i+1, "Etiqueta inválida", f"'{texto}' → reemplázalo por la etiqueta correcta."))
+    partes.append(f"\nTotal de caracteres especiales eliminados: {especiales_count}\n")
+    return "".join(partes).encode("utf-8")
 
-        match = re.match(r"^([A-ZÁÉÍÓÚÑ]+:)", texto)
-        if match:
-            etiqueta = match.group(1)
-            if etiqueta not in ETIQUETAS_VALIDAS:
-                errores.append((i+1, "Etiqueta inválida", f"Se encontró '{etiqueta}'"))
-            else:
-                if texto == etiqueta:
-                    errores.append((i+1, "Formato incorrecto", f"La etiqueta '{etiqueta}' está sola."))
-
-                if etiqueta in ["ENTREVISTADOR:", "ENTREVISTADORA:"]:
-                    encabezado_ok = any(run.text.strip().startswith(etiqueta) and run.bold for run in para.runs)
-                    if not encabezado_ok:
-                        errores.append((i+1, "Encabezado sin negrita", f"La etiqueta '{etiqueta}' debería estar en negrita."))
-
-                    all_bold = all(run.bold or not run.text.strip() for run in para.runs)
-                    if not all_bold:
-                        errores.append((i+1, "Formato en negrita", f"El texto de '{etiqueta}' debería estar completamente en negrita."))
-
-        # Fuente/tamaño
-        for run in para.runs:
-            fuente = run.font.name
-            tamano = run.font.size.pt if run.font.size else None
-            if fuente and fuente.lower() != "arial":
-                errores.append((i+1, "Fuente incorrecta", f"Fuente '{fuente}' en vez de Arial."))
-                break
-            if tamano and tamano != 12:
-                errores.append((i+1, "Tamaño incorrecto", f"{tamano}pt en vez de 12pt."))
-                break
-
-        # Limpieza de caracteres
-        for run in para.runs:
-            if run.text:
-                encontrados = re.findall(REGEX_PERMITIDOS, run.text)
-                if encontrados:
-                    especiales_count += len(encontrados)
-                    char_counter.update(encontrados)
-                    run.text = re.sub(REGEX_PERMITIDOS, "", run.text)
+def validar_y_limpiar(doc: Document, filename: str):
+    errores, especiales_count = validar_parrafos(doc.paragraphs)
 
     # Guardar doc limpio
     docx_bytes = io.BytesIO()
     doc.save(docx_bytes)
     docx_bytes.seek(0)
 
-    # Crear reporte TXT
-    txt_bytes = io.BytesIO()
-    txt_bytes.write(f"📋 REPORTE: {filename}\nGenerado: {datetime.now()}\n\n".encode("utf-8"))
-    for linea, tipo, desc in errores:
-        txt_bytes.write(f"Línea {linea}: {tipo} → {desc}\n".encode("utf-8"))
+    return docx_bytes, crear_reporte(filename, errores, especiales_count)
 
-    txt_bytes.write(f"\nTotal de caracteres especiales eliminados: {especiales_count}\n".encode("utf-8"))
-    txt_bytes.seek(0)
+# ==========================
+# Lectura rápida del .docx (sin python-docx)
+# ==========================
+# Vista mínima de word/document.xml con la misma forma que usa validar_parrafos
+# (para.text, para.runs, run.text, run.bold, run.font.name, run.font.size).
+# Los valores se convierten con los tipos de python-docx para que coincidan.
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+ParrafoXML = namedtuple("ParrafoXML", "text runs")
+RunXML = namedtuple("RunXML", "text bold font")
+FuenteXML = namedtuple("FuenteXML", "name size")
+
+# Contenido de texto de un run, igual que Run.text de python-docx
+_TEXTO_RUN = {
+    W_NS + "t": lambda e: e.text or "",
+    W_NS + "tab": lambda e: "\t",
+    W_NS + "ptab": lambda e: "\t",
+    W_NS + "cr": lambda e: "\n",
+    W_NS + "noBreakHyphen": lambda e: "-",
+    W_NS + "br": lambda e: "\n" if e.get(W_NS + "type", "textWrapping") == "textWrapping" else "",
+}
+
+def _texto_run(r) -> str:
+    return "".join(_TEXTO_RUN[e.tag](e) for e in r if e.tag in _TEXTO_RUN)
+
+def _leer_run(r) -> RunXML:
+    bold = fuente = tamano = None
+    rPr = r.find(W_NS + "rPr")
+    if rPr is not None:
+        b = rPr.find(W_NS + "b")
+        if b is not None:
+            val = b.get(W_NS + "val")
+            bold = True if val is None else ST_OnOff.convert_from_xml(val)
+        rFonts = rPr.find(W_NS + "rFonts")
+        if rFonts is not None:
+            fuente = rFonts.get(W_NS + "ascii")
+        sz = rPr.find(W_NS + "sz")
+        if sz is not None and sz.get(W_NS + "val") is not None:
+            tamano = ST_HpsMeasure.convert_from_xml(sz.get(W_NS + "val"))
+    return RunXML(_texto_run(r), bold, FuenteXML(fuente, tamano))
+
+def _leer_parrafo(p) -> ParrafoXML:
+    runs = []
+    textos = []
+    # para.text incluye el texto de los hipervínculos; para.runs no
+    for e in p.iterchildren(W_NS + "r", W_NS + "hyperlink"):
+        if e.tag == W_NS + "r":
+            run = _leer_run(e)
+            runs.append(run)
+            textos.append(run.text)
+        else:
+            textos.extend(_texto_run(r) for r in e.iterchildren(W_NS + "r"))
+    return ParrafoXML("".join(textos), runs)
+
+CT_NS = "{http://schemas.openxmlformats.org/package/2006/content-types}"
+RELS_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# Los uploads no son de confianza: sin entidades ni red (igual que el parser de python-docx)
+_PARSER_SEGURO = {"resolve_entities": False, "no_network": True}
+
+def _es_documento_word(z: zipfile.ZipFile) -> bool:
+    """True si el paquete declara word/document.xml como documento principal .docx.
+
+    python-docx rechaza, p. ej., un zip con solo word/document.xml o una plantilla
+    (template.main+xml); sin este chequeo la vía rápida los devolvería como "limpios".
+    """
+    parser = etree.XMLParser(**_PARSER_SEGURO)
+    tipos = etree.fromstring(z.read("[Content_Types].xml"), parser)
+    principal = any(
+        o.get("PartName") == "/word/document.xml" and o.get("ContentType") == CT.WML_DOCUMENT_MAIN
+        for o in tipos.iterchildren(CT_NS + "Override")
+    )
+    rels = etree.fromstring(z.read("_rels/.rels"), parser)
+    apunta = any(
+        r.get("Type") == RT.OFFICE_DOCUMENT and r.get("Target").lstrip("/") == "word/document.xml"
+        for r in rels.iterchildren(RELS_NS + "Relationship")
+    )
+    return principal and apunta
+
+def leer_parrafos(path: str):
+    """Párrafos del cuerpo (equivalente a doc.paragraphs) con un iterparse en streaming.
+
+    Genera los párrafos a medida que los lee; ValueError si no es un .docx.
+    """
+    cuerpo = W_NS + "body"
+    with zipfile.ZipFile(path) as z:
+        if not _es_documento_word(z):
+            raise ValueError("no es un documento .docx")
+        with z.open("word/document.xml") as xml:
+            eventos = etree.iterparse(
+                xml, tag=(W_NS + "p", W_NS + "tbl", W_NS + "sdt"), **_PARSER_SEGURO
+            )
+            for _, el in eventos:
+                parent = el.getparent()
+                if parent is None or parent.tag != cuerpo:
+                    continue
+                if el.tag == W_NS + "p":
+                    yield _leer_parrafo(el)
+                # Liberar lo ya procesado
+                el.clear()
+                while el.getprevious() is not None:
+                    del parent[0]
+
+def leer_parrafos_sin_limpieza(path: str):
+    """Párrafos del cuerpo si ningún run necesita limpieza; None en cuanto aparece uno.
+
+    Los transcripts suelen tener algún carácter no permitido (!, ;, -, ", ¡) y en ese
+    caso igual hace falta python-docx: cortar en el primero acota el trabajo perdido.
+    """
+    parrafos = []
+    with closing(leer_parrafos(path)) as it:
+        for para in it:
+            if any(caracteres_raros(run.text) for run in para.runs):
+                return None
+            parrafos.append(para)
+    return parrafos
 
-    return docx_bytes, txt_bytes
+# ==========================
+# Procesamiento en paralelo
+# ==========================
+# python-docx es Python puro (GIL): cada archivo se valida en un proceso aparte.
+# "spawn" explícito: el pool se crea cuando ya hay hilos (asyncio.to_thread) y
+# hacer fork de un proceso con hilos puede quedar bloqueado.
+def _nuevo_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("spawn")
+    )
+
+EXECUTOR = _nuevo_pool()
+
+def _reiniciar_pool(roto: ProcessPoolExecutor):
+    """Reemplazar el pool si un worker murió (OOM, segfault); si no, queda roto para siempre"""
+    global EXECUTOR
+    if EXECUTOR is roto:
+        EXECUTOR = _nuevo_pool()
+        roto.shutdown(wait=False, cancel_futures=True)
+
+async def ejecutar_en_pool(path: str, filename: str):
+    """procesar_archivo en el pool. None si el archivo no pudo procesarse.
+
+    Si el pool se rompe, se recrea y el archivo se reintenta una vez: la muerte
+    de un worker hace fallar todo lo que estaba en curso, no solo al culpable.
+    Si vuelve a romperse, solo ese archivo se da por fallido.
+    """
+    loop = asyncio.get_running_loop()
+    for intento in range(2):
+        executor = EXECUTOR
+        try:
+            return await loop.run_in_executor(executor, procesar_archivo, path, filename)
+        except BrokenProcessPool:
+            _reiniciar_pool(executor)
+    return None
+
+def guardar_upload(upload: UploadFile, dst):
+    """Copiar el upload por bloques al archivo temporal dst (y cerrarlo)"""
+    upload.file.seek(0)
+    with dst:
+        shutil.copyfileobj(upload.file, dst)
+
+def procesar_archivo(path: str, filename: str):
+    """Worker: valida el .docx en disco. None si no es un docx válido."""
+    # Si hay caracteres que limpiar, hace falta python-docx para guardar el doc;
+    # si la vía rápida no pudo leerlo (o no es un .docx válido), decide python-docx
+    try:
+        parrafos = leer_parrafos_sin_limpieza(path)
+    except Exception:
+        parrafos = None
+
+    if parrafos is None:
+        try:
+            doc = Document(path)
+        except Exception:
+            return None
+        return validar_y_limpiar(doc, filename)
+
+    # Nada que modificar: se valida la vista ligera y el "limpio" es el original
+    errores, especiales_count = validar_parrafos(parrafos)
+    with open(path, "rb") as f:
+        docx_bytes = io.BytesIO(f.read())
+    return docx_bytes, crear_reporte(filename, errores, especiales_count)
+
+def agregar_al_zip(zipf: zipfile.ZipFile, filename: str, resultado):
+    """Agregar el docx limpio y el reporte de un archivo al zip"""
+    if resultado is None:
+        return
+    docx_bytes, txt_bytes = resultado
+
+    # Copiar el buffer por bloques al miembro del zip, sin materializar .read()
+    with zipf.open(filename.replace(".docx", "_limpio.docx"), "w") as dst:
+        shutil.copyfileobj(docx_bytes, dst)
+    zipf.writestr(filename.replace(".docx", "_errores.txt"), txt_bytes)
+
+async def _sin_cortar(aw):
+    """Esperar aw aunque cancelen la request: un hilo a medio escribir en el zip
+    no se puede interrumpir, y cerrar el zip con el miembro abierto falla."""
+    tarea = asyncio.ensure_future(aw)
+    try:
+        return await asyncio.shield(tarea)
+    except asyncio.CancelledError:
+        await asyncio.wait([tarea])
+        raise
 
 # ==========================
 # Endpoint múltiple
@@ -151,25 +502,48 @@ async def procesar(files: List[UploadFile] = File(...)):
     if not files:
         raise HTTPException(status_code=400, detail="Debes subir al menos un archivo .docx")
 
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w") as zipf:
-        for file in files:
-            if not file.filename.lower().endswith(".docx"):
-                continue
-            try:
-                doc = Document(file.file)
-            except Exception as e:
-                continue
-
-            docx_bytes, txt_bytes = validar_y_limpiar(doc, file.filename)
-
-            zipf.writestr(file.filename.replace(".docx", "_limpio.docx"), docx_bytes.read())
-            zipf.writestr(file.filename.replace(".docx", "_errores.txt"), txt_bytes.read())
-
-    zip_buffer.seek(0)
+    docx_files = [f for f in files if f.filename.lower().endswith(".docx")]
+
+    # El zip se escribe directo a disco para no retenerlo en RAM hasta que expire
+    zip_file = tempfile.NamedTemporaryFile(suffix=".zip", delete=False, dir=DOWNLOADS_DIR)
+    # Los workers leen desde disco: el proceso principal no carga los uploads en RAM
+    rutas = []
+    futures = []
+    ok = False
+    try:
+        for f in docx_files:
+            tmp = tempfile.NamedTemporaryFile(suffix=".docx", delete=False)
+            rutas.append(tmp.name)  # registrada antes de copiar, para borrarla siempre
+            await asyncio.to_thread(guardar_upload, f, tmp)
+        futures = [
+            asyncio.ensure_future(ejecutar_en_pool(ruta, f.filename))
+            for ruta, f in zip(rutas, docx_files)
+        ]
+
+        # Cada archivo se agrega al zip apenas termina (en orden), sin esperar
+        # el lote completo ni retener todos los resultados a la vez.
+        # docx/txt son XML/texto: deflate nivel 1 reduce bastante con poco CPU
+        with zipfile.ZipFile(zip_file, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1) as zipf:
+            for f, future in zip(docx_files, futures):
+                resultado = await future
+                await _sin_cortar(asyncio.to_thread(agregar_al_zip, zipf, f.filename, resultado))
+        ok = True
+    finally:
+        # Ante un error o una cancelación, no dejar workers en cola leyendo
+        # entradas borradas ni excepciones sin recuperar
+        for future in futures:
+            future.cancel()
+        if futures:
+            await asyncio.gather(*futures, return_exceptions=True)
+        for ruta in rutas:
+            os.unlink(ruta)
+        zip_file.close()
+        if not ok:
+            os.unlink(zip_file.name)
 
     token = str(uuid.uuid4())
-    DOWNLOADS[token] = (zip_buffer.getvalue(), datetime.utcnow() + timedelta(minutes=EXP_MINUTES))
+    DOWNLOADS[token] = (zip_file.name, datetime.utcnow() + timedelta(minutes=EXP_MINUTES))
+    schedule_expiry(token)
 
     return JSONResponse({"token": token})
 
@@ -179,13 +553,29 @@ def download_token(token: str):
     item = DOWNLOADS.get(token)
     if not item:
         raise HTTPException(status_code=404, detail="Link expirado o inválido")
-    data, exp = item
+    path, exp = item
     if exp <= datetime.utcnow():
-        DOWNLOADS.pop(token, None)
+        remove_download(token)
         raise HTTPException(status_code=410, detail="Link expirado")
 
-    headers = {"Content-Disposition": "attachment; filename=reportes_transcripciones.zip"}
-    return StreamingResponse(io.BytesIO(data), media_type="application/zip", headers=headers)
+    # Se abre aquí: si la tarea de expiración ya lo borró, es un link expirado.
+    # Una vez abierto, borrarlo no corta la descarga en curso.
+    try:
+        data = open(path, "rb")
+    except FileNotFoundError:
+        remove_download(token)
+        raise HTTPException(status_code=410, detail="Link expirado")
+
+    headers = {
+        "Content-Disposition": "attachment; filename=reportes_transcripciones.zip",
+        "Content-Length": str(os.fstat(data.fileno()).st_size),
+    }
+    return StreamingResponse(_iter_file(data), media_type="application/zip", headers=headers)
+
+def _iter_file(f, chunk_size: int = 64 * 1024):
+    with f:
+        while chunk := f.read(chunk_size):
+            yield chunk
 
 # ==========================
 # Health check
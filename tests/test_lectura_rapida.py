@@ -0,0 +1,149 @@
+"""La vía rápida (iterparse) debe ver lo mismo que python-docx."""
+import io
+import zipfile
+
+import pytest
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from docx.shared import Pt
+
+import main
+
+
+def _xml(fragmento):
+    return parse_xml(fragmento.replace("<w:r>", f"<w:r {nsdecls('w')}>", 1))
+
+
+@pytest.fixture
+def docx_limpio(tmp_path):
+    """Documento sin caracteres a limpiar, con los casos que lee la vía rápida."""
+    d = Document()
+    d.add_paragraph("00:12")
+    p = d.add_paragraph()
+    r = p.add_run("ENTREVISTADOR:")
+    r.bold = True
+    p.add_run(" hola mundo")
+    p = d.add_paragraph()
+    r = p.add_run("ENTREVISTADORA: todo")
+    r.bold = True
+    p.add_run(" mas").bold = False
+    d.add_paragraph("ENTREVISTADO: bien xxx SPEAKER 1")
+    d.add_paragraph("USUARIO algo")
+    d.add_paragraph("FOO: bar")
+    d.add_paragraph("   ")
+    p = d.add_paragraph()
+    p.add_run("texto").font.name = "Times"
+    p = d.add_paragraph()
+    p.add_run("texto").font.size = Pt(13.5)
+    p = d.add_paragraph()
+    r = p.add_run("Arial ok")
+    r.font.name = "Arial"
+    r.font.size = Pt(12)
+
+    # Tablas y sdt: su contenido no está en doc.paragraphs
+    d.add_table(rows=1, cols=1).cell(0, 0).text = "ENTREVISTADOR: en tabla"
+    d.element.body.append(parse_xml(
+        f'<w:sdt {nsdecls("w")}><w:sdtContent><w:p><w:r><w:t>Speaker en sdt</w:t></w:r></w:p>'
+        '</w:sdtContent></w:sdt>'
+    ))
+
+    # Tabs y saltos de línea
+    p = d.add_paragraph()
+    r = p.add_run("ENTREVISTADOR:")
+    r.add_tab()
+    r.add_break()
+    p.add_run("x")
+
+    # Hipervínculo: cuenta en para.text, no en para.runs
+    p = d.add_paragraph("con link ")
+    p._p.append(parse_xml(
+        f'<w:hyperlink {nsdecls("w", "r")} r:id="rId9"><w:r><w:t>Speaker link</w:t></w:r></w:hyperlink>'
+    ))
+
+    # w:b w:val="0", salto de página, ptab y tamaños con unidades / medios puntos
+    d.add_paragraph()._p.append(_xml(
+        '<w:r><w:rPr><w:b w:val="0"/><w:sz w:val="12pt"/></w:rPr><w:t>ENTREVISTADOR: nob</w:t>'
+        '<w:br w:type="page"/><w:cr/>'
+        '<w:ptab w:relativeTo="margin" w:alignment="left" w:leader="none"/></w:r>'
+    ))
+    d.add_paragraph()._p.append(_xml(
+        '<w:r><w:rPr><w:b w:val="true"/><w:sz w:val="25"/></w:rPr><w:t>ENTREVISTADORA: b</w:t></w:r>'
+    ))
+    d.add_paragraph("ENTREVISTADA:")
+
+    path = tmp_path / "limpio.docx"
+    d.save(path)
+    return str(path)
+
+
+def _reemplazar_parte(origen, destino, nombre, transformar):
+    with zipfile.ZipFile(origen) as zin, zipfile.ZipFile(destino, "w") as zout:
+        for item in zin.infolist():
+            data = zin.read(item.filename)
+            if item.filename == nombre:
+                data = transformar(data)
+            zout.writestr(item, data)
+
+
+def test_parrafos_y_runs_coinciden(docx_limpio):
+    esperados = Document(docx_limpio).paragraphs
+    leidos = list(main.leer_parrafos(docx_limpio))
+    assert len(leidos) == len(esperados)
+    for a, b in zip(esperados, leidos):
+        assert a.text == b.text
+        assert [(r.text, r.bold, r.font.name, r.font.size) for r in a.runs] == [
+            (r.text, r.bold, r.font.name, r.font.size) for r in b.runs
+        ]
+
+
+def test_validacion_coincide(docx_limpio):
+    rapida = main.validar_parrafos(main.leer_parrafos_sin_limpieza(docx_limpio))
+    assert rapida == main.validar_parrafos(Document(docx_limpio).paragraphs)
+    assert rapida[0]  # el fixture produce errores de todos los tipos
+
+
+def test_documento_limpio_se_devuelve_intacto(docx_limpio):
+    docx_bytes, _ = main.procesar_archivo(docx_limpio, "limpio.docx")
+    with open(docx_limpio, "rb") as f:
+        assert docx_bytes.getvalue() == f.read()
+
+
+def test_caracter_no_permitido_usa_python_docx(docx_limpio, tmp_path):
+    sucio = tmp_path / "sucio.docx"
+    _reemplazar_parte(docx_limpio, sucio, "word/document.xml",
+                      lambda x: x.replace(b"hola mundo", "hola “mundo”".encode()))
+    assert main.leer_parrafos_sin_limpieza(str(sucio)) is None
+
+    docx_bytes, reporte = main.procesar_archivo(str(sucio), "sucio.docx")
+    assert b"eliminados: 2" in reporte
+    assert "hola mundo" in [p.text for p in Document(docx_bytes).paragraphs][1]
+
+
+def test_rechaza_zip_sin_paquete(docx_limpio, tmp_path):
+    solo_xml = tmp_path / "solo.docx"
+    with zipfile.ZipFile(docx_limpio) as zin, zipfile.ZipFile(solo_xml, "w") as zout:
+        zout.writestr("word/document.xml", zin.read("word/document.xml"))
+    assert main.procesar_archivo(str(solo_xml), "solo.docx") is None
+
+
+def test_rechaza_plantilla(docx_limpio, tmp_path):
+    plantilla = tmp_path / "plantilla.docx"
+    _reemplazar_parte(docx_limpio, plantilla, "[Content_Types].xml",
+                      lambda x: x.replace(b"document.main+xml", b"template.main+xml"))
+    assert main.procesar_archivo(str(plantilla), "plantilla.docx") is None
+
+
+def test_no_resuelve_entidades(docx_limpio, tmp_path, monkeypatch):
+    secreto = tmp_path / "secreto.txt"
+    secreto.write_text("speaker-secreto")
+    malicioso = tmp_path / "xxe.docx"
+
+    def inyectar(xml):
+        decl, resto = xml.split(b"?>", 1)
+        dtd = f'<!DOCTYPE w:document [<!ENTITY e SYSTEM "file://{secreto}">]>'.encode()
+        return decl + b"?>" + dtd + resto.replace(b"hola mundo", b"&e;", 1)
+
+    _reemplazar_parte(docx_limpio, malicioso, "word/document.xml", inyectar)
+    textos = [p.text for p in main.leer_parrafos(str(malicioso))]
+    assert not any("secreto" in t for t in textos)